@@ -13,11 +13,89 @@ import time
 import base64
 import sys
 import functools
+import hashlib
+import threading
+import random
 
 import requests
+try:
+    from urllib3.exceptions import NewConnectionError
+except ImportError:  # Some old requests only has its vendored urllib3
+    from requests.packages.urllib3.exceptions import NewConnectionError
+try:
+    from orjson import loads as _json_loads  # Optional, and faster if available
+except ImportError:
+    from json import loads as _json_loads
 
 
 string_types = (str,) if sys.version_info[0] >= 3 else (basestring, )
+_json_loads_accepts_bytes = (  # Python 3.0 to 3.5 could only json.loads(str)
+    _json_loads.__module__ != "json" or not (3,) <= sys.version_info < (3, 6))
+_monotonic = getattr(time, "monotonic", time.time)  # Python 2 has no monotonic
+
+# Grant types defined in https://tools.ietf.org/html/rfc6749
+GRANT_TYPE_AUTHORIZATION_CODE = "authorization_code"
+GRANT_TYPE_PASSWORD = "password"
+GRANT_TYPE_CLIENT_CREDENTIALS = "client_credentials"
+GRANT_TYPE_REFRESH_TOKEN = "refresh_token"
+
+
+def _get_body(resp):
+    # The raw bytes, when available and parsable, avoid an intermediate string
+    # which some libraries (such as requests) would decode per each access.
+    content = getattr(resp, "content", None)
+    if _json_loads_accepts_bytes and isinstance(content, bytes):
+        return content
+    return resp.text
+
+
+def _is_unsent(connection_error):
+    # True when the request surely did not reach the server
+    if isinstance(connection_error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(  # requests wraps urllib3's MaxRetryError
+        connection_error.args[0] if connection_error.args else None,
+        "reason", None)
+    return isinstance(reason, NewConnectionError)  # e.g. Connection refused
+
+
+def _mono_remaining(flow, default):
+    # Seconds left of a device flow, by the monotonic clock which won't jump.
+    # That clock is only meaningful on the host (and boot) which created it,
+    # so a deadline too far away from now, either way, came from elsewhere.
+    deadline = flow.get("_mono_deadline")
+    if deadline is not None:
+        remaining = deadline - _monotonic()
+        if abs(remaining) <= flow.get("expires_in", 0):
+            return remaining
+    return default
+
+
+class _PendingResponse(dict):
+    # An authorization_pending response, whose body is not parsed yet
+    __slots__ = ("body",)
+
+    def __init__(self, body):
+        super(_PendingResponse, self).__init__(error="authorization_pending")
+        self.body = body
+
+
+def _complete(result):  # Parses the full body, if it was deferred
+    return _json_loads(result.body) if isinstance(
+        result, _PendingResponse) else result
+
+
+class _Flight(object):  # A token request which concurrent identical ones wait for
+    __slots__ = ("done", "response")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+
+
+class _ReusedResponse(dict):
+    # A token response which did not come from the server this time
+    __slots__ = ()
 
 
 class BaseClient(object):
@@ -25,6 +103,14 @@ class BaseClient(object):
     # more friendly to remind you what parameters are needed in each scenario.
     # More on Client Types at https://tools.ietf.org/html/rfc6749#section-2.1
 
+    __slots__ = (  # Faster attribute access. Sub-class may still add attributes.
+        "configuration", "client_id", "client_secret", "client_assertion",
+        "default_headers", "default_body", "logger",
+        "_http_client", "_owns_http_client",
+        "_basic_auth",
+        "_token_cache", "_inflight", "_inflight_lock",
+        "__dict__", "__weakref__")
+
     @staticmethod
     def encode_saml_assertion(assertion):
         return base64.urlsafe_b64encode(assertion).rstrip(b'=')  # Per RFC 7522
@@ -33,6 +119,16 @@ class BaseClient(object):
     CLIENT_ASSERTION_TYPE_SAML2 = "urn:ietf:params:oauth:client-assertion-type:saml2-bearer"
     client_assertion_encoders = {CLIENT_ASSERTION_TYPE_SAML2: encode_saml_assertion}
 
+    # Successful responses of these grants will be reused until they expire
+    cacheable_grant_types = (GRANT_TYPE_CLIENT_CREDENTIALS, GRANT_TYPE_REFRESH_TOKEN)
+    token_cache_skew = 5*60  # Cached response is considered expired this early
+    token_request_max_attempts = 3  # Including retries. Set it to 1 to disable.
+    # Requests of these grants can be replayed, so they will be retried on 5xx
+    # or network error. Other grants may contain a single-use credential
+    # (such as authorization code, device code or a rotating refresh token),
+    # so they will only be retried when the request was not even sent out.
+    retriable_grant_types = (GRANT_TYPE_CLIENT_CREDENTIALS,)
+
     @property
     def session(self):
         warnings.warn("Will be gone in next major release", DeprecationWarning)
@@ -42,6 +138,7 @@ class BaseClient(object):
     def session(self, value):
         warnings.warn("Will be gone in next major release", DeprecationWarning)
         self._http_client = value
+        self._owns_http_client = False  # It is provided by the caller now
 
 
     def __init__(
@@ -138,6 +235,10 @@ class BaseClient(object):
         if client_assertion_type is not None:
             self.default_body["client_assertion_type"] = client_assertion_type
         self.logger = logging.getLogger(__name__)
+        self._basic_auth = (None, None)  # ((client_id, client_secret), value)
+        self._token_cache = {}  # {key: (expires_at, obtained_at, response)}
+        self._inflight = {}  # {key: _Flight}, to coalesce concurrent requests
+        self._inflight_lock = threading.Lock()
         if http_client:
             if verify is not None or proxies is not None or timeout is not None:
                 raise ValueError(
@@ -151,6 +252,23 @@ class BaseClient(object):
             self._http_client.request = functools.partial(
                 # A workaround for requests not supporting session-wide timeout
                 self._http_client.request, timeout=timeout)
+        # The same session shall be reused by all requests of this client,
+        # so that we benefit from its connection pool (i.e. keep-alive)
+        self._owns_http_client = not http_client
+
+    def close(self):
+        """Release the connections held by the http client created by us.
+
+        An http client provided by you will be left as-is.
+        """
+        if self._owns_http_client:
+            self._http_client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
 
     def _build_auth_request_params(self, response_type, **kwargs):
         # response_type is a string defined in
@@ -167,6 +285,102 @@ class BaseClient(object):
         return params  # A dict suitable to be used in http request
 
     def _obtain_token(  # The verb "obtain" is influenced by OAUTH2 RFC 6749
+            self, grant_type,
+            params=None,  # a dict to be sent as query string to the endpoint
+            data=None,  # All relevant data, which will go into the http body
+            force_refresh=False,  # True to bypass previously obtained response
+            **kwargs  # Relay all extra parameters to _request_token()
+            ):  # Returns the json object came from the OAUTH2 response
+        if grant_type not in self.cacheable_grant_types or (data or {}).get(
+                "claims"):  # A claims challenge always needs a new token
+            return self._request_token(grant_type, params=params, data=data, **kwargs)
+        key = self._build_token_cache_key(grant_type, params, data)
+        if force_refresh:
+            resp = self._request_token(grant_type, params=params, data=data, **kwargs)
+            self._cache_token(key, resp)
+            return resp
+        cached = self._get_cached_token(key)
+        if cached:
+            return cached
+        with self._inflight_lock:
+            flight = self._inflight.get(key)
+            is_leader = flight is None
+            if is_leader:
+                flight = self._inflight[key] = _Flight()
+        if not is_leader:  # An identical request is on its way. Share its result.
+            flight.done.wait()
+            if flight.response is not None:
+                return _ReusedResponse(flight.response)
+            # Otherwise that request raised. We will try on our own.
+            return self._request_token(grant_type, params=params, data=data, **kwargs)
+        try:
+            cached = self._get_cached_token(key)  # Maybe a previous flight got it
+            if cached:
+                flight.response = cached
+                return cached
+            resp = self._request_token(grant_type, params=params, data=data, **kwargs)
+            self._cache_token(key, resp)
+            flight.response = dict(resp)  # Error response is also shared
+            return resp
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def _build_token_cache_key(self, grant_type, params, data):
+        _data = dict(data or {})
+        if _data.get("scope"):
+            _data["scope"] = self._stringify(_data["scope"])
+        # Headers are not part of the key, they typically contain correlation id.
+        # The body is hashed, so that no secret (such as RT) lingers in the key.
+        return (grant_type, self.client_id, hashlib.sha256(json.dumps(
+            [params, _data], sort_keys=True, default=str).encode("utf-8")
+            ).hexdigest())
+
+    def _get_cached_token(self, key):
+        expires_at, obtained_at, resp = self._token_cache.get(key, (0, 0, None))
+        now = time.time()
+        if resp and expires_at - self.token_cache_skew - now > 0:
+            self.logger.debug("Reuse a previously obtained token response")
+            reused = _ReusedResponse(resp, expires_in=int(expires_at - now))
+            for field in ("ext_expires_in", "refresh_in"):  # Also relative to then
+                if field in reused:
+                    remaining = int(reused[field]) - (now - obtained_at)
+                    if remaining > 0:
+                        reused[field] = int(remaining)
+                    else:
+                        reused.pop(field)
+            return reused
+
+    def _get_token_expires_at(self, resp):
+        # Returns when this response expires, or None if it shall not be cached
+        if "error" not in resp and "access_token" in resp and resp.get("expires_in"):
+            return time.time() + int(resp["expires_in"])
+
+    def _cache_token(self, key, resp):
+        expires_at = self._get_token_expires_at(resp)
+        if expires_at:
+            now = time.time()
+            for k, (exp, _, _) in list(self._token_cache.items()):  # Purge stale
+                if exp < now:
+                    self._token_cache.pop(k, None)
+            self._token_cache[key] = (expires_at, now, dict(resp))
+
+    def _get_basic_auth(self):
+        credentials = (self.client_id, self.client_secret)
+        if self._basic_auth[0] != credentials:  # Computed once per credentials
+            self._basic_auth = (credentials, "Basic " + base64.b64encode(
+                "{}:{}".format(
+                    # Per https://tools.ietf.org/html/rfc6749#section-2.3.1
+                    # client_id and client_secret needs to be encoded by
+                    # "application/x-www-form-urlencoded"
+                    # https://www.w3.org/TR/html401/interact/forms.html#h-17.13.4.1
+                    # BEFORE they are fed into HTTP Basic Authentication
+                    quote_plus(self.client_id), quote_plus(self.client_secret)
+                ).encode("ascii")).decode("ascii"))
+        return self._basic_auth[1]
+
+    def _request_token(
             self, grant_type,
             params=None,  # a dict to be sent as query string to the endpoint
             data=None,  # All relevant data, which will go into the http body
@@ -195,7 +409,8 @@ class BaseClient(object):
 
         _headers = {'Accept': 'application/json'}
         _headers.update(self.default_headers)
-        _headers.update(headers or {})
+        if headers:
+            _headers.update(headers)
 
         # Quoted from https://tools.ietf.org/html/rfc6749#section-2.3.1
         # Clients in possession of a client password MAY use the HTTP Basic
@@ -205,31 +420,47 @@ class BaseClient(object):
         # client credentials in the request-body using the following
         # parameters: client_id, client_secret.
         if self.client_secret and self.client_id:
-            _headers["Authorization"] = "Basic " + base64.b64encode("{}:{}".format(
-                # Per https://tools.ietf.org/html/rfc6749#section-2.3.1
-                # client_id and client_secret needs to be encoded by
-                # "application/x-www-form-urlencoded"
-                # https://www.w3.org/TR/html401/interact/forms.html#h-17.13.4.1
-                # BEFORE they are fed into HTTP Basic Authentication
-                quote_plus(self.client_id), quote_plus(self.client_secret)
-                ).encode("ascii")).decode("ascii")
+            _headers["Authorization"] = self._get_basic_auth()
 
         if "token_endpoint" not in self.configuration:
             raise ValueError("token_endpoint not found in configuration")
-        resp = (post or self._http_client.post)(
-            self.configuration["token_endpoint"],
-            headers=_headers, params=params, data=_data,
-            **kwargs)
-        if resp.status_code >= 500:
-            resp.raise_for_status()  # TODO: Will probably retry here
+        _post = post or self._http_client.post
+        replayable = grant_type in self.retriable_grant_types
+        for attempt in range(self.token_request_max_attempts):
+            last_attempt = attempt == self.token_request_max_attempts - 1
+            try:
+                resp = _post(
+                    self.configuration["token_endpoint"],
+                    headers=_headers, params=params, data=_data,
+                    **kwargs)
+            except requests.exceptions.ConnectionError as e:
+                if last_attempt or not (replayable or _is_unsent(e)):
+                    raise
+                self.logger.debug("Token endpoint unreachable. Will retry.")
+            else:
+                if resp.status_code < 500:
+                    break
+                if last_attempt or not replayable:
+                    resp.raise_for_status()
+                    break  # Not all http clients would raise
+                self.logger.debug(
+                    "Token endpoint returned %d. Will retry.", resp.status_code)
+            # Exponential backoff with jitter: roughly 0.25s, 0.5s, 1s, ...
+            time.sleep(0.25 * (2 ** attempt) + random.random() * 0.1)
+        return self._parse_token_response(grant_type, resp)
+
+    def _parse_token_response(self, grant_type, resp):
+        body = _get_body(resp)
         try:
             # The spec (https://tools.ietf.org/html/rfc6749#section-5.2) says
             # even an error response will be a valid json structure,
             # so we simply return it here, without needing to invent an exception.
-            return json.loads(resp.text)
+            return _json_loads(body)
         except ValueError:
             self.logger.exception(
-                    "Token response is not in json format: %s", resp.text)
+                    "Token response is not in json format: %s",
+                    body.decode("utf-8", "replace") if isinstance(body, bytes)
+                        else body)
             raise
 
     def obtain_token_by_refresh_token(self, refresh_token, scope=None, **kwargs):
@@ -240,11 +471,14 @@ class BaseClient(object):
         :param scope: If omitted, is treated as equal to the scope originally
             granted by the resource owner,
             according to https://tools.ietf.org/html/rfc6749#section-6
+
+        A successful response will be reused by subsequent identical calls,
+        until it is about to expire. Use `force_refresh=True` to bypass that.
         """
-        assert isinstance(refresh_token, string_types)
-        data = kwargs.pop('data', {})
-        data.update(refresh_token=refresh_token, scope=scope)
-        return self._obtain_token("refresh_token", data=data, **kwargs)
+        if not isinstance(refresh_token, string_types):  # Survives python -O
+            raise TypeError("refresh_token must be a string")
+        data = dict(kwargs.pop('data', {}), refresh_token=refresh_token, scope=scope)
+        return self._obtain_token(GRANT_TYPE_REFRESH_TOKEN, data=data, **kwargs)
 
     def _stringify(self, sequence):
         if isinstance(sequence, (list, set, tuple)):
@@ -257,6 +491,9 @@ class Client(BaseClient):  # We choose to implement all 4 grants in 1 class
 
     Its methods define and document parameters mentioned in OAUTH2 RFC 6749.
     """
+    __slots__ = (
+        "on_obtaining_tokens", "on_removing_rt", "on_updating_rt",
+        "_device_code_key", "_device_grant_type")
     DEVICE_FLOW = {  # consts for device flow, that can be customized by sub-class
         "GRANT_TYPE": "urn:ietf:params:oauth:grant-type:device_code",
         "DEVICE_CODE": "device_code",
@@ -281,6 +518,17 @@ class Client(BaseClient):  # We choose to implement all 4 grants in 1 class
 
         And possibly here
         https://tools.ietf.org/html/draft-ietf-oauth-device-flow-12#section-3.3.1
+
+        The returned flow is a plain dict, so that it can be persisted as JSON.
+        Besides the keys from the server, such as "device_code" and "user_code",
+        it is guaranteed to contain these normalized keys:
+
+        * "interval" (int): Seconds to wait between polls.
+        * "expires_in" (int): Lifetime of this flow, in seconds.
+        * "expires_at" (float): Epoch time when this flow expires.
+
+        Keys prefixed with an underscore, as well as "latest_attempt_at",
+        are maintained by this library during polling. Do not rely on them.
         """
         DAE = "device_authorization_endpoint"
         if not self.configuration.get(DAE):
@@ -289,37 +537,73 @@ class Client(BaseClient):  # We choose to implement all 4 grants in 1 class
             data={"client_id": self.client_id, "scope": self._stringify(scope or [])},
             headers=dict(self.default_headers, **kwargs.pop("headers", {})),
             **kwargs)
-        flow = json.loads(resp.text)
-        flow["interval"] = int(flow.get("interval", 5))  # Some IdP returns string
-        flow["expires_in"] = int(flow.get("expires_in", 1800))
-        flow["expires_at"] = time.time() + flow["expires_in"]  # We invent this
+        flow = _json_loads(_get_body(resp))
+        expires_in = int(flow.get("expires_in", 1800))
+        flow.update(
+            interval=int(flow.get("interval", 5)),  # Some IdP returns string
+            expires_in=expires_in,
+            expires_at=time.time() + expires_in,  # We invent this
+            # Same deadline, on a clock which won't jump when system time changes
+            _mono_deadline=_monotonic() + expires_in,
+            )
         return flow
 
+    def _parse_token_response(self, grant_type, resp):
+        if grant_type == self._device_grant_type and resp.status_code == 400:
+            body = _get_body(resp)
+            if (b'"authorization_pending"' if isinstance(body, bytes)
+                    else '"authorization_pending"') in body:
+                # The most common response during polling.
+                # Its parsing is deferred until it is returned to caller.
+                return _PendingResponse(body)
+        return super(Client, self)._parse_token_response(grant_type, resp)
+
     def _obtain_token_by_device_flow(self, flow, **kwargs):
         # type: (dict, **dict) -> dict
         # This method updates flow during each run. And it is non-blocking.
-        now = time.time()
+        return _complete(self._poll_device_flow(flow, **kwargs))
+
+    def _poll_device_flow(self, flow, **kwargs):
+        # Same as _obtain_token_by_device_flow(), but may return _PendingResponse
+        now = _monotonic()  # Interval arithmetic shall survive system time change
         skew = 1
-        if flow.get("latest_attempt_at", 0) + flow.get("interval", 5) - skew > now:
-            warnings.warn('Attempted too soon. Please do time.sleep(flow["interval"])')
+        latest_attempt_at = flow.get("latest_attempt_at")  # None if never polled
+        interval = flow.get("interval", 5)
+        if latest_attempt_at is not None and (
+                latest_attempt_at <= now < latest_attempt_at + interval - skew):
+            # Attempted too soon. Do not bother the server, just mimic its answer.
+            # Caller shall wait flow["interval"] seconds before next attempt.
+            return {"error": "authorization_pending", "interval": interval}
         data = kwargs.pop("data", {})
         data.update({
             "client_id": self.client_id,
-            self.DEVICE_FLOW["DEVICE_CODE"]: flow["device_code"],
+            self._device_code_key: flow["device_code"],
             })
         result = self._obtain_token(
-            self.DEVICE_FLOW["GRANT_TYPE"], data=data, **kwargs)
+            self._device_grant_type, data=data, **kwargs)
         if result.get("error") == "slow_down":
             # Respecting https://tools.ietf.org/html/draft-ietf-oauth-device-flow-12#section-3.5
-            flow["interval"] = flow.get("interval", 5) + 5
+            # plus a 20% safety margin, in case our clock runs faster than server's,
+            # and 40% more once we were told to slow down more than once.
+            slowdowns = flow["_slowdowns"] = flow.get("_slowdowns", 0) + 1
+            if slowdowns > 1:
+                self.logger.warning(
+                    "Server asked to slow down %d times. Is the clock drifting?",
+                    slowdowns)
+            interval = int(interval * (1.2 + 0.4 * min(slowdowns - 1, 1))) + 5
+            remaining = _mono_remaining(
+                flow, flow.get("expires_at", float("inf")) - time.time())
+            flow["interval"] = int(max(1, min(interval, remaining)))  # Cap at expiry
         flow["latest_attempt_at"] = now
         return result
 
     def obtain_token_by_device_flow(self,
             flow,
-            exit_condition=lambda flow: flow.get("expires_at", 0) < time.time(),
+            exit_condition=lambda flow: flow.get("expires_at", 0) < time.time()
+                or _mono_remaining(flow, float("inf")) < 0,
+            cancel_event=None,
             **kwargs):
-        # type: (dict, Callable) -> dict
+        # type: (dict, Callable, Optional[threading.Event]) -> dict
         """Obtain token by a device flow object, with customizable polling effect.
 
         Args:
@@ -343,14 +627,26 @@ class Client(BaseClient):  # We choose to implement all 4 grants in 1 class
                     exit_condition = lambda flow: True
 
                 to make the loop run only once, i.e. no polling, hence non-block.
+
+            cancel_event (threading.Event):
+                Optional. When provided, the loop sleeps on this event
+                between polls, rather than waking up every second
+                to check the exit_condition, and it exits as soon as
+                the event is set by another thread.
+                The exit_condition is still checked before each wait.
         """
         while True:
-            result = self._obtain_token_by_device_flow(flow, **kwargs)
+            result = self._poll_device_flow(flow, **kwargs)
             if result.get("error") not in self.DEVICE_FLOW_RETRIABLE_ERRORS:
-                return result
+                return _complete(result)
+            if cancel_event is not None:
+                if exit_condition(flow) or cancel_event.wait(
+                        flow.get("interval", 5)):  # Returns True once it is set
+                    return _complete(result)
+                continue
             for i in range(flow.get("interval", 5)):  # Wait interval seconds
                 if exit_condition(flow):
-                    return result
+                    return _complete(result)
                 time.sleep(1)  # Shorten each round, to make exit more responsive
 
     def build_auth_request_uri(
@@ -425,14 +721,14 @@ class Client(BaseClient):  # We choose to implement all 4 grants in 1 class
             # client_id is required, if the client is not authenticating itself.
             # See https://tools.ietf.org/html/rfc6749#section-4.1.3
             data["client_id"] = self.client_id
-        return self._obtain_token("authorization_code", data=data, **kwargs)
+        return self._obtain_token(GRANT_TYPE_AUTHORIZATION_CODE, data=data, **kwargs)
 
     def obtain_token_by_username_password(
             self, username, password, scope=None, **kwargs):
         """The Resource Owner Password Credentials Grant, used by legacy app."""
-        data = kwargs.pop("data", {})
-        data.update(username=username, password=password, scope=scope)
-        return self._obtain_token("password", data=data, **kwargs)
+        data = dict(
+            kwargs.pop("data", {}), username=username, password=password, scope=scope)
+        return self._obtain_token(GRANT_TYPE_PASSWORD, data=data, **kwargs)
 
     def obtain_token_for_client(self, scope=None, **kwargs):
         """Obtain token for this client (rather than for an end user),
@@ -443,10 +739,67 @@ class Client(BaseClient):  # We choose to implement all 4 grants in 1 class
         You can still explicitly provide an optional client_secret parameter,
         or you can provide such extra parameters as `default_body` during the
         class initialization.
+
+        A successful response will be reused by subsequent calls with the same
+        scope and data, until it is about to expire. Use `force_refresh=True`
+        to obtain a new token regardless, for example after app roles changed.
+        Calls containing `claims` in data will always obtain a new token.
         """
-        data = kwargs.pop("data", {})
-        data.update(scope=scope)
-        return self._obtain_token("client_credentials", data=data, **kwargs)
+        data = dict(kwargs.pop("data", {}), scope=scope)
+        return self._obtain_token(GRANT_TYPE_CLIENT_CREDENTIALS, data=data, **kwargs)
+
+    def obtain_tokens_bulk(self, scopes, concurrency=8, **kwargs):
+        # type: (list, int, **dict) -> list
+        """Obtain tokens for this client, one per scope, concurrently.
+
+        Each item of `scopes` is sent via :func:`~obtain_token_for_client`
+        in its own request, with up to `concurrency` requests in flight,
+        all of them sharing the same http client.
+
+        :param scopes: A list, each item of which is a scope parameter
+            acceptable by :func:`~obtain_token_for_client`.
+        :param concurrency: Maximal number of concurrent requests.
+            You may want to keep it within the connection pool size
+            of your http client (which is 10 for a requests session).
+        :return: A list of the same length as `scopes`, in the same order.
+            Each item is either a response dict, or the exception raised
+            when obtaining that token.
+        """
+        if not isinstance(concurrency, int) or concurrency < 1:
+            raise ValueError("concurrency must be a positive integer")
+
+        def obtain(scope):
+            try:
+                return self.obtain_token_for_client(scope=scope, **kwargs)
+            except Exception as e:  # Returned, so that other tokens still count
+                return e
+
+        if not scopes:
+            return []
+        workers = min(concurrency, len(scopes))
+        try:
+            from concurrent.futures import ThreadPoolExecutor
+        except ImportError:  # Python 2 without the "futures" backport
+            results = [None] * len(scopes)
+            pending = iter(range(len(scopes)))  # Shared by all workers
+            lock = threading.Lock()
+
+            def run():
+                while True:
+                    with lock:
+                        i = next(pending, None)
+                    if i is None:
+                        return
+                    results[i] = obtain(scopes[i])
+
+            threads = [threading.Thread(target=run) for _ in range(workers)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            return results
+        with ThreadPoolExecutor(workers) as executor:
+            return list(executor.map(obtain, scopes))
 
     def __init__(self,
             server_configuration, client_id,
@@ -455,6 +808,9 @@ class Client(BaseClient):  # We choose to implement all 4 grants in 1 class
             on_updating_rt=lambda token_item, new_rt: None,
             **kwargs):
         super(Client, self).__init__(server_configuration, client_id, **kwargs)
+        # Looked up once, rather than during each device flow polling
+        self._device_code_key = self.DEVICE_FLOW["DEVICE_CODE"]
+        self._device_grant_type = self.DEVICE_FLOW["GRANT_TYPE"]
         self.on_obtaining_tokens = on_obtaining_tokens
         self.on_removing_rt = on_removing_rt
         self.on_updating_rt = on_updating_rt
@@ -467,10 +823,12 @@ class Client(BaseClient):  # We choose to implement all 4 grants in 1 class
         _data = data.copy()  # to prevent side effect
         resp = super(Client, self)._obtain_token(
             grant_type, params, _data, *args, **kwargs)
-        if "error" not in resp:
+        if "error" not in resp and not isinstance(resp, _ReusedResponse):
+            # A reused response has already been through this callback
             _resp = resp.copy()
-            RT = "refresh_token"
-            if grant_type == RT and RT in _resp and not also_save_rt:
+            RT = "refresh_token"  # The key in response
+            if (grant_type == GRANT_TYPE_REFRESH_TOKEN and RT in _resp
+                    and not also_save_rt):
                 # Then we skip it from on_obtaining_tokens();
                 # Leave it to self.obtain_token_by_refresh_token()
                 _resp.pop(RT, None)
@@ -534,7 +892,8 @@ class Client(BaseClient):  # We choose to implement all 4 grants in 1 class
         if resp.get('error') == 'invalid_grant':
             (on_removing_rt or self.on_removing_rt)(token_item)  # Discard old RT
         RT = "refresh_token"
-        if on_updating_rt is not False and RT in resp:
+        if on_updating_rt is not False and RT in resp and not isinstance(
+                resp, _ReusedResponse):  # Its RT was already updated back then
             (on_updating_rt or self.on_updating_rt)(token_item, resp[RT])
         return resp
 
@@ -75,6 +75,7 @@ class Client(oauth2.Client):
 
     See its specs at https://openid.net/connect/
     """
+    __slots__ = ()
 
     def decode_id_token(self, id_token, nonce=None):
         """See :func:`~decode_id_token`."""
@@ -91,6 +92,14 @@ class Client(oauth2.Client):
             ret["id_token_claims"] = self.decode_id_token(ret["id_token"])
         return ret
 
+    def _get_token_expires_at(self, resp):
+        # A cached response shall not outlive the id token inside it
+        expires_at = super(Client, self)._get_token_expires_at(resp)
+        if expires_at and "id_token" in resp:
+            expires_at = min(expires_at, json.loads(
+                decode_part(resp["id_token"].split('.')[1])).get("exp", expires_at))
+        return expires_at
+
     def build_auth_request_uri(self, response_type, nonce=None, **kwargs):
         """Generate an authorization uri to be visited by resource owner.
 
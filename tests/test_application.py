@@ -310,3 +310,40 @@ class TestApplicationForClientCapabilities(unittest.TestCase):
 
     def test_both_claims_and_capabilities_none(self):
         self.assertEqual(_merge_claims_challenge_and_capabilities(None, None), None)
+
+
+class TestConfidentialClientApplicationForClientCredentials(unittest.TestCase):
+
+    def setUp(self):
+        authority_url = "https://login.microsoftonline.com/common"
+        class DiscoveryHttpClient(object):  # Only OIDC Discovery uses get()
+            def get(self, url, **kwargs):
+                return MinimalResponse(status_code=200, text=json.dumps({
+                    "authorization_endpoint":
+                        authority_url + "/oauth2/v2.0/authorize",
+                    "token_endpoint": authority_url + "/oauth2/v2.0/token",
+                    }))
+        self.app = ConfidentialClientApplication(
+            "my_app", client_credential="my_secret", authority=authority_url,
+            http_client=DiscoveryHttpClient())
+        self.requests_sent = []
+
+    def _post(self, url, **kwargs):
+        self.requests_sent.append(kwargs)
+        return MinimalResponse(
+            status_code=200, text='{"access_token": "at", "expires_in": 3600}')
+
+    def test_force_refresh_will_be_relayed_to_client_and_telemetry(self):
+        self.app.acquire_token_for_client(["s1"], post=self._post)
+        self.app.acquire_token_for_client(["s1"], post=self._post)
+        self.assertEqual(1, len(self.requests_sent),
+            "The second call should reuse the first response")
+        self.app.acquire_token_for_client(
+            ["s1"], force_refresh=True, post=self._post)
+        self.assertEqual(2, len(self.requests_sent))
+        self.assertEqual(
+            "1|{},0|".format(ClientApplication.ACQUIRE_TOKEN_FOR_CLIENT_ID),
+            self.requests_sent[0]["headers"][CLIENT_CURRENT_TELEMETRY])
+        self.assertEqual(
+            "1|{},1|".format(ClientApplication.ACQUIRE_TOKEN_FOR_CLIENT_ID),
+            self.requests_sent[1]["headers"][CLIENT_CURRENT_TELEMETRY])
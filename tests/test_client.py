@@ -1,15 +1,18 @@
 import os
+import sys
 import json
+import base64
 import logging
 try:  # Python 2
     from urlparse import urljoin
 except:  # Python 3
     from urllib.parse import urljoin
 import time
+import threading
 
 import requests
 
-from msal.oauth2cli import Client, JwtSigner
+from msal.oauth2cli import Client, JwtSigner, oauth2
 from msal.oauth2cli.authcode import obtain_auth_code
 from tests import unittest, Oauth2TestCase
 from tests.http_client import MinimalHttpClient, MinimalResponse
@@ -220,6 +223,12 @@ class TestRefreshTokenCallbacks(unittest.TestCase):
         client.obtain_token_by_refresh_token(
             {"refresh_token": "old"}, on_updating_rt=False, post=self._dummy)
 
+    def test_rt_of_wrong_type_will_be_rejected(self):
+        client = Client({"token_endpoint": "http://example.com/token"}, "client_id")
+        with self.assertRaises(TypeError):
+            client.obtain_token_by_refresh_token(
+                {"refresh_token": None}, post=self._dummy)
+
 
 class TestSessionAccessibility(unittest.TestCase):
     def test_accessing_session_property_for_backward_compatibility(self):
@@ -228,3 +237,375 @@ class TestSessionAccessibility(unittest.TestCase):
         client.session.close()
         client.session = "something"
 
+    def test_closing_client_will_not_close_http_client_provided_by_caller(self):
+        http_client = MinimalHttpClient()
+        http_client.close = lambda: self.fail("This should not be called here")
+        with Client({}, "client_id", http_client=http_client):
+            pass
+
+    def test_closing_client_will_close_its_own_http_client(self):
+        closed = []
+        with Client({}, "client_id") as client:
+            client._http_client.close = lambda: closed.append(True)
+        self.assertEqual([True], closed)
+
+    def test_closing_client_will_not_close_session_assigned_by_caller(self):
+        http_client = MinimalHttpClient()
+        http_client.close = lambda: self.fail("This should not be called here")
+        with Client({}, "client_id") as client:
+            client.session = http_client
+
+
+class TestTokenResponseReuse(unittest.TestCase):
+
+    def setUp(self):
+        self.requests_sent = []
+        self.client = Client(
+            {"token_endpoint": "http://example.com/token"},
+            "client_id",
+            http_client=MinimalHttpClient(),
+            )
+
+    def _post(self, text):
+        def post(url, **kwargs):
+            self.requests_sent.append(kwargs)
+            return MinimalResponse(status_code=200, text=text)
+        return post
+
+    def test_unexpired_response_will_be_reused(self):
+        post = self._post('{"access_token": "at", "expires_in": 3600}')
+        first = self.client.obtain_token_for_client(scope=["s1", "s2"], post=post)
+        second = self.client.obtain_token_for_client(scope=["s2", "s1"], post=post)
+        self.assertEqual(1, len(self.requests_sent))
+        self.assertEqual(first["access_token"], second["access_token"])
+
+    def test_reused_response_will_not_trigger_on_obtaining_tokens(self):
+        events = []
+        self.client.on_obtaining_tokens = events.append
+        post = self._post('{"access_token": "at", "expires_in": 3600}')
+        self.client.obtain_token_for_client(scope=["s1"], post=post)
+        self.client.obtain_token_for_client(scope=["s1"], post=post)
+        self.assertEqual(1, len(events))
+
+    def test_reused_response_will_have_its_lifetimes_rebased(self):
+        post = self._post('{"access_token": "at", "expires_in": 3600, '
+            '"ext_expires_in": 7200, "refresh_in": 1800}')
+        self.client.obtain_token_for_client(scope=["s1"], post=post)
+        key, (expires_at, obtained_at, resp) = self.client._token_cache.popitem()
+        self.client._token_cache[key] = (  # As if it were obtained 2000s ago
+            expires_at - 2000, obtained_at - 2000, resp)
+        reused = self.client.obtain_token_for_client(scope=["s1"], post=post)
+        self.assertEqual(1, len(self.requests_sent))
+        self.assertAlmostEqual(1600, reused["expires_in"], delta=1)
+        self.assertAlmostEqual(5200, reused["ext_expires_in"], delta=1)
+        self.assertNotIn("refresh_in", reused)
+
+    def test_different_scope_will_not_reuse_response(self):
+        post = self._post('{"access_token": "at", "expires_in": 3600}')
+        self.client.obtain_token_for_client(scope=["s1"], post=post)
+        self.client.obtain_token_for_client(scope=["s2"], post=post)
+        self.assertEqual(2, len(self.requests_sent))
+
+    def test_nearly_expired_response_will_not_be_reused(self):
+        post = self._post('{"access_token": "at", "expires_in": 60}')
+        self.client.obtain_token_for_client(scope=["s1"], post=post)
+        self.client.obtain_token_for_client(scope=["s1"], post=post)
+        self.assertEqual(2, len(self.requests_sent))
+
+    def test_response_will_not_be_reused_beyond_its_id_token(self):
+        id_token = "header.%s.signature" % base64.b64encode(json.dumps({
+            "iss": "issuer", "sub": "subject", "aud": "client_id",
+            "exp": time.time() + 200,  # Shorter than expires_in and the skew
+            "iat": time.time(),
+            }).encode()).decode("utf-8")
+        post = self._post(json.dumps({
+            "access_token": "at", "expires_in": 3600, "id_token": id_token}))
+        self.client.obtain_token_by_refresh_token("rt", post=post)
+        self.client.obtain_token_by_refresh_token("rt", post=post)
+        self.assertEqual(2, len(self.requests_sent))
+
+    def test_force_refresh_will_not_reuse_response(self):
+        post = self._post('{"access_token": "at", "expires_in": 3600}')
+        self.client.obtain_token_for_client(scope=["s1"], post=post)
+        self.client.obtain_token_for_client(
+            scope=["s1"], force_refresh=True, post=post)
+        self.assertEqual(2, len(self.requests_sent))
+
+    def test_claims_challenge_will_not_reuse_response(self):
+        post = self._post('{"access_token": "at", "expires_in": 3600}')
+        for _ in range(2):
+            self.client.obtain_token_for_client(
+                scope=["s1"], data={"claims": '{"access_token": {}}'}, post=post)
+        self.assertEqual(2, len(self.requests_sent))
+
+    def test_password_grant_response_will_not_be_kept(self):
+        post = self._post('{"access_token": "at", "expires_in": 3600}')
+        self.client.obtain_token_by_username_password("u", "secret", post=post)
+        self.client.obtain_token_by_username_password("u", "secret", post=post)
+        self.assertEqual(2, len(self.requests_sent))
+        self.assertEqual({}, self.client._token_cache)
+
+    def test_error_response_will_not_be_reused(self):
+        post = self._post('{"error": "invalid_client"}')
+        self.client.obtain_token_for_client(scope=["s1"], post=post)
+        self.client.obtain_token_for_client(scope=["s1"], post=post)
+        self.assertEqual(2, len(self.requests_sent))
+
+    def test_concurrent_identical_requests_will_share_one_response(self):
+        def post(url, **kwargs):
+            self.requests_sent.append(kwargs)
+            time.sleep(0.2)  # So that other threads will arrive in the meantime
+            return MinimalResponse(status_code=400, text='{"error": "e"}')
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.client.obtain_token_for_client(scope=["s1"], post=post)))
+            for _ in range(5)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(1, len(self.requests_sent))
+        self.assertEqual([{"error": "e"}] * 5, results)
+
+
+
+class TestDeviceFlowPolling(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Client(
+            {"token_endpoint": "http://example.com/token"},
+            "client_id",
+            http_client=MinimalHttpClient(),
+            )
+        self.flow = {
+            "device_code": "dc", "interval": 5,
+            "expires_in": 60, "expires_at": time.time() + 60}
+
+    def test_initiating_flow_will_not_expose_default_headers(self):
+        self.client.configuration["device_authorization_endpoint"] = "http://dae"
+        self.client.default_headers = {"foo": "bar"}
+        def post(url, headers=None, **kwargs):
+            headers["mutated"] = "by http client"
+            return MinimalResponse(status_code=200, text='{"device_code": "dc"}')
+        self.client._http_client.post = post
+        self.client.initiate_device_flow(scope=["s1"])
+        self.assertEqual({"foo": "bar"}, self.client.default_headers)
+
+    def _pending(self, url, **kwargs):
+        return MinimalResponse(status_code=400, text=json.dumps({
+            "error": "authorization_pending", "error_description": "AADSTS70016"}))
+
+    def test_setting_cancel_event_will_stop_polling(self):
+        cancel_event = threading.Event()
+        threading.Timer(0.1, cancel_event.set).start()
+        started = time.time()
+        result = self.client.obtain_token_by_device_flow(
+            self.flow, cancel_event=cancel_event, post=self._pending)
+        self.assertEqual({  # Diagnostics in the real body are not lost
+            "error": "authorization_pending", "error_description": "AADSTS70016",
+            }, result)
+        self.assertIs(dict, type(result))
+        self.assertLess(time.time() - started, self.flow["interval"])
+
+    def test_pending_response_will_be_returned_in_full(self):
+        result = self.client._obtain_token_by_device_flow(
+            self.flow, post=self._pending)
+        self.assertEqual("AADSTS70016", result.get("error_description"))
+
+    def _slow_down(self, url, **kwargs):
+        return MinimalResponse(status_code=400, text='{"error": "slow_down"}')
+
+    def test_slow_down_will_increase_interval(self):
+        self.client._obtain_token_by_device_flow(self.flow, post=self._slow_down)
+        self.assertEqual(11, self.flow["interval"])
+
+    def test_repeated_slow_down_will_increase_interval_more(self):
+        self.flow["expires_at"] = time.time() + 600
+        self.client._obtain_token_by_device_flow(self.flow, post=self._slow_down)
+        self.flow["latest_attempt_at"] -= 60  # Pretend the interval elapsed
+        self.client._obtain_token_by_device_flow(self.flow, post=self._slow_down)
+        self.assertEqual(int(11 * 1.6) + 5, self.flow["interval"])
+
+    def test_slow_down_will_not_increase_interval_beyond_expiry(self):
+        self.flow["_mono_deadline"] = oauth2._monotonic() + 8
+        self.client._obtain_token_by_device_flow(self.flow, post=self._slow_down)
+        self.assertLessEqual(self.flow["interval"], 8)
+
+    def test_deadline_from_another_host_will_be_ignored(self):
+        self.flow["_mono_deadline"] = oauth2._monotonic() - 10**6  # Or another boot
+        self.assertEqual(None, oauth2._mono_remaining(self.flow, None))
+        self.client._obtain_token_by_device_flow(self.flow, post=self._slow_down)
+        self.assertEqual(11, self.flow["interval"])  # Not clamped to 1 second
+
+    def test_other_polling_error_will_be_parsed_as_is(self):
+        result = self.client._obtain_token_by_device_flow(
+            self.flow, post=lambda url, **kwargs: MinimalResponse(
+                status_code=400,
+                text='{"error": "expired_token", "error_description": "foo"}'))
+        self.assertEqual(
+            {"error": "expired_token", "error_description": "foo"}, result)
+
+    def test_first_polling_will_be_sent_even_shortly_after_boot(self):
+        monotonic = oauth2._monotonic
+        oauth2._monotonic = lambda: 2  # Windows' clock starts from boot
+        try:
+            result = self.client._obtain_token_by_device_flow(
+                self.flow, post=self._pending)
+        finally:
+            oauth2._monotonic = monotonic  # Unpatch
+        self.assertEqual("AADSTS70016", result.get("error_description"))
+
+    def test_polling_too_soon_will_not_send_request(self):
+        self.client._obtain_token_by_device_flow(self.flow, post=self._pending)
+        result = self.client._obtain_token_by_device_flow(
+            self.flow, post=lambda url, **kwargs: self.fail("Should not be sent"))
+        self.assertEqual("authorization_pending", result.get("error"))
+
+
+class TestBulkTokens(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Client(
+            {"token_endpoint": "http://example.com/token"},
+            "client_id",
+            http_client=MinimalHttpClient(),
+            )
+
+    def test_tokens_can_be_obtained_in_bulk(self):
+        def post(url, data=None, **kwargs):
+            if data["scope"] == "bad":
+                raise requests.exceptions.InvalidURL()
+            threads.add(threading.current_thread().ident)
+            return MinimalResponse(status_code=200, text=json.dumps(
+                {"access_token": data["scope"], "expires_in": 3600}))
+        threads = set()
+        results = self.client.obtain_tokens_bulk(
+            ["s1", "bad", "s2", "s3"], concurrency=2, post=post)
+        self.assertLessEqual(len(threads), 2)
+        self.assertEqual("s1", results[0]["access_token"])
+        self.assertIsInstance(results[1], requests.exceptions.InvalidURL)
+        self.assertEqual("s2", results[2]["access_token"])
+        self.assertEqual("s3", results[3]["access_token"])
+
+    def test_tokens_can_be_obtained_in_bulk_without_concurrent_futures(self):
+        futures = sys.modules.get("concurrent.futures")
+        sys.modules["concurrent.futures"] = None  # Mimic Python 2
+        try:
+            self.test_tokens_can_be_obtained_in_bulk()
+        finally:
+            if futures:
+                sys.modules["concurrent.futures"] = futures
+            else:
+                sys.modules.pop("concurrent.futures")
+
+    def test_invalid_concurrency_will_be_rejected(self):
+        with self.assertRaises(ValueError):
+            self.client.obtain_tokens_bulk(["s1"], concurrency=0)
+
+
+class TestTokenRequestPreparation(unittest.TestCase):
+
+    def test_changed_defaults_and_secret_will_take_effect(self):
+        sent = []
+        def post(url, **kwargs):
+            sent.append(kwargs)
+            return MinimalResponse(status_code=200, text='{"error": "e"}')
+        client = Client(
+            {"token_endpoint": "http://example.com/token"}, "client_id",
+            http_client=MinimalHttpClient(), client_secret="old")
+        client.obtain_token_by_authorization_code("code", post=post)
+        client.default_body["foo"] = "bar"
+        client.default_headers["X-A"] = "1"
+        client.client_secret = "new"
+        client.obtain_token_by_authorization_code("code", post=post)
+        self.assertNotIn("foo", sent[0]["data"])
+        self.assertEqual("bar", sent[1]["data"].get("foo"))
+        self.assertEqual("1", sent[1]["headers"].get("X-A"))
+        self.assertNotEqual(
+            sent[0]["headers"]["Authorization"], sent[1]["headers"]["Authorization"])
+
+
+class TestTokenRequestRetry(unittest.TestCase):
+
+    def setUp(self):
+        self.requests_sent = []
+        self.client = Client(
+            {"token_endpoint": "http://example.com/token"},
+            "client_id",
+            http_client=MinimalHttpClient(),
+            )
+        self.sleeps = []
+        self._sleep, time.sleep = time.sleep, self.sleeps.append  # Patch
+
+    def tearDown(self):
+        time.sleep = self._sleep  # Unpatch
+
+    def test_server_error_will_be_retried(self):
+        responses = [
+            MinimalResponse(status_code=503, text="Service Unavailable"),
+            MinimalResponse(status_code=200, text='{"access_token": "at"}'),
+            ]
+        def post(url, **kwargs):
+            self.requests_sent.append(kwargs)
+            return responses.pop(0)
+        result = self.client.obtain_token_for_client(scope=["s1"], post=post)
+        self.assertEqual("at", result.get("access_token"))
+        self.assertEqual(2, len(self.requests_sent))
+
+    def test_connection_error_will_be_raised_after_retries(self):
+        def post(url, **kwargs):
+            self.requests_sent.append(kwargs)
+            raise requests.exceptions.ConnectionError()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client.obtain_token_for_client(scope=["s1"], post=post)
+        self.assertEqual(
+            self.client.token_request_max_attempts, len(self.requests_sent))
+
+    def test_final_server_error_will_be_returned_without_more_backoff(self):
+        def post(url, **kwargs):
+            self.requests_sent.append(kwargs)
+            return MinimalResponse(status_code=503, text='{"error": "e"}')
+        result = self.client.obtain_token_for_client(scope=["s1"], post=post)
+        self.assertEqual({"error": "e"}, result)
+        self.assertEqual(
+            self.client.token_request_max_attempts, len(self.requests_sent))
+        self.assertEqual(len(self.requests_sent) - 1, len(self.sleeps))
+
+    def test_single_use_grant_will_not_be_replayed_on_server_error(self):
+        def post(url, **kwargs):
+            self.requests_sent.append(kwargs)
+            return MinimalResponse(status_code=503, text='{"error": "e"}')
+        self.client.obtain_token_by_authorization_code("code", post=post)
+        self.assertEqual(1, len(self.requests_sent))
+
+    def test_single_use_grant_will_not_be_replayed_after_disconnection(self):
+        def post(url, **kwargs):
+            self.requests_sent.append(kwargs)
+            raise requests.exceptions.ConnectionError("RemoteDisconnected")
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client.obtain_token_by_authorization_code("code", post=post)
+        self.assertEqual(1, len(self.requests_sent))
+
+    def test_single_use_grant_will_be_retried_when_not_sent(self):
+        def post(url, **kwargs):
+            self.requests_sent.append(kwargs)
+            if len(self.requests_sent) == 1:
+                raise requests.exceptions.ConnectTimeout()
+            return MinimalResponse(status_code=200, text='{"access_token": "at"}')
+        result = self.client.obtain_token_by_authorization_code("code", post=post)
+        self.assertEqual("at", result.get("access_token"))
+        self.assertEqual(2, len(self.requests_sent))
+
+
+class TestTokenResponseParsing(unittest.TestCase):
+
+    @unittest.skipUnless(oauth2._json_loads_accepts_bytes, "Needs Python 3.6+")
+    def test_raw_bytes_will_be_parsed_when_available(self):
+        resp = MinimalResponse(status_code=200, text="Not to be used")
+        resp.content = b'{"access_token": "at"}'
+        client = Client(
+            {"token_endpoint": "http://example.com/token"}, "client_id",
+            http_client=MinimalHttpClient())
+        result = client.obtain_token_by_authorization_code(
+            "code", post=lambda url, **kwargs: resp)
+        self.assertEqual("at", result.get("access_token"))